@@ -0,0 +1,124 @@
+import math
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+from priority import DEFAULT_PRIORITY, PRIORITY_LANES, PrioritySemaphore, QueueFull, percentiles
+
+load_dotenv()
+
+MAX_CONCURRENT_ANALYSES = int(os.getenv("MAX_CONCURRENT_ANALYSES", "4"))
+MAX_QUEUED_ANALYSES = int(os.getenv("MAX_QUEUED_ANALYSES", "16"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "60"))
+DEFAULT_STUDY_SECONDS = float(os.getenv("DEFAULT_STUDY_SECONDS", "60"))
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason, estimated_wait):
+        super().__init__(reason)
+        self.reason = reason
+        self.estimated_wait = estimated_wait
+        self.retry_after = max(1, math.ceil(estimated_wait))
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_concurrent=MAX_CONCURRENT_ANALYSES,
+        max_queue_depth=MAX_QUEUED_ANALYSES,
+        queue_timeout=ADMISSION_QUEUE_TIMEOUT,
+        default_duration=DEFAULT_STUDY_SECONDS,
+        history_size=200,
+    ):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue_depth = max(0, max_queue_depth)
+        self.queue_timeout = queue_timeout
+        self.default_duration = default_duration
+        self._slots = PrioritySemaphore(self.max_concurrent)
+        self._lock = threading.Lock()
+        self._durations = deque(maxlen=history_size)
+        self._lane_latencies = {lane: deque(maxlen=history_size) for lane in PRIORITY_LANES}
+        self._lane_waits = {lane: deque(maxlen=history_size) for lane in PRIORITY_LANES}
+        self._counters = {"admitted": 0, "rejected": 0, "timed_out": 0}
+
+    def _typical_duration(self):
+        if not self._durations:
+            return self.default_duration
+        return statistics.median(self._durations)
+
+    def _estimate_wait(self, position, active):
+        if active < self.max_concurrent and position == 0:
+            return 0.0
+        waves = position // self.max_concurrent + 1
+        return round(waves * self._typical_duration(), 1)
+
+    def _slot_state(self):
+        slot_stats = self._slots.stats()
+        return slot_stats["active"], sum(slot_stats["queued"].values())
+
+    def acquire(self, lane=DEFAULT_PRIORITY, timeout=None):
+        timeout = self.queue_timeout if timeout is None else timeout
+        try:
+            admitted = self._slots.acquire(lane, timeout=timeout, max_queued=self.max_queue_depth)
+        except QueueFull:
+            active, queued = self._slot_state()
+            with self._lock:
+                self._counters["rejected"] += 1
+                raise AdmissionRejected("Admission queue is full", self._estimate_wait(queued, active))
+        if not admitted:
+            active, queued = self._slot_state()
+            with self._lock:
+                self._counters["timed_out"] += 1
+                raise AdmissionRejected("Timed out waiting for admission", self._estimate_wait(queued, active))
+        with self._lock:
+            self._counters["admitted"] += 1
+
+    def release(self, lane=DEFAULT_PRIORITY, duration=None, queue_wait=None):
+        self._slots.release()
+        with self._lock:
+            if duration is not None:
+                self._durations.append(duration)
+                self._lane_latencies[lane].append(duration + (queue_wait or 0.0))
+            if queue_wait is not None:
+                self._lane_waits[lane].append(queue_wait)
+
+    @contextmanager
+    def admitted(self, lane=DEFAULT_PRIORITY, timeout=None):
+        enqueued_at = time.perf_counter()
+        self.acquire(lane, timeout)
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.release(lane)
+            raise
+        self.release(lane, time.perf_counter() - start, start - enqueued_at)
+
+    def stats(self):
+        slot_stats = self._slots.stats()
+        active = slot_stats["active"]
+        queued = sum(slot_stats["queued"].values())
+        with self._lock:
+            return {
+                "active": active,
+                "max_concurrent": self.max_concurrent,
+                "queue_depth": queued,
+                "max_queue_depth": self.max_queue_depth,
+                "utilisation": round(active / self.max_concurrent, 3),
+                "estimated_wait_seconds": self._estimate_wait(queued, active),
+                "typical_study_seconds": round(self._typical_duration(), 1),
+                **self._counters,
+                "lanes": {
+                    lane: {
+                        "queue_depth": slot_stats["queued"][lane],
+                        "samples": len(self._lane_latencies[lane]),
+                        "latency_seconds": percentiles(self._lane_latencies[lane]),
+                        "queue_wait_seconds": percentiles(self._lane_waits[lane]),
+                    }
+                    for lane in PRIORITY_LANES
+                },
+            }
@@ -0,0 +1,210 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+from pipeline import MODEL_ID_TO_FINDING
+
+MODEL_IDS = tuple(MODEL_ID_TO_FINDING)
+FINDING_NAMES = tuple(MODEL_ID_TO_FINDING[model_id] for model_id in MODEL_IDS)
+MODEL_INDEX = {model_id: index for index, model_id in enumerate(MODEL_IDS)}
+POSITIVE_THRESHOLD = 0.5
+DRIFT_BINS = np.linspace(0.0, 1.0, 11)
+
+
+class CohortScores:
+    def __init__(self, study_ids, scores):
+        scores = np.asarray(scores, dtype=np.float32)
+        if scores.ndim != 2 or scores.shape[1] != len(MODEL_IDS):
+            raise ValueError(f"scores must have shape (n_studies, {len(MODEL_IDS)}), got {scores.shape}")
+        if len(study_ids) != scores.shape[0]:
+            raise ValueError(f"Got {len(study_ids)} study ids for {scores.shape[0]} score rows")
+        self.study_ids = np.asarray(study_ids, dtype=str)
+        self.scores = scores
+
+    def __len__(self):
+        return self.scores.shape[0]
+
+    @classmethod
+    def from_classifications(cls, records, size_hint=0):
+        study_ids = []
+        scores = np.full((max(size_hint, 16), len(MODEL_IDS)), np.nan, dtype=np.float32)
+        for row, (study_id, classification) in enumerate(records):
+            if row >= scores.shape[0]:
+                grown = np.full((scores.shape[0] * 2, len(MODEL_IDS)), np.nan, dtype=np.float32)
+                grown[:row] = scores[:row]
+                scores = grown
+            study_ids.append(study_id)
+            for model_id, info in (classification or {}).items():
+                index = MODEL_INDEX.get(model_id)
+                if index is not None and info.get("score") is not None and not info.get("error"):
+                    scores[row, index] = info["score"]
+        return cls(study_ids, scores[:len(study_ids)])
+
+    @classmethod
+    def from_results_store(cls, store=None, batch_size=1000):
+        if store is None:
+            from results_store import ResultsStore
+
+            store = ResultsStore()
+        return cls.from_classifications(store.iter_classifications(batch_size), store.count_classified())
+
+    @classmethod
+    def concat(cls, cohorts):
+        cohorts = list(cohorts)
+        if not cohorts:
+            return cls([], np.empty((0, len(MODEL_IDS)), dtype=np.float32))
+        return cls(
+            np.concatenate([cohort.study_ids for cohort in cohorts]),
+            np.concatenate([cohort.scores for cohort in cohorts]),
+        )
+
+    def positives(self, threshold=POSITIVE_THRESHOLD):
+        with np.errstate(invalid="ignore"):
+            return self.scores > threshold
+
+    def observed(self):
+        return ~np.isnan(self.scores)
+
+    def prevalence(self, threshold=POSITIVE_THRESHOLD):
+        counts = self.observed().sum(axis=0)
+        positives = self.positives(threshold).sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, positives / counts, np.nan)
+
+    def mean_scores(self):
+        counts = self.observed().sum(axis=0)
+        totals = np.nansum(self.scores, axis=0, dtype=np.float64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, totals / counts, np.nan)
+
+    def histograms(self, bins=DRIFT_BINS):
+        bucket = np.clip(np.digitize(self.scores, bins[1:-1]), 0, len(bins) - 2)
+        n_bins = len(bins) - 1
+        flat = (bucket + np.arange(len(MODEL_IDS)) * n_bins)[self.observed()]
+        counts = np.bincount(flat, minlength=len(MODEL_IDS) * n_bins)
+        return counts.reshape(len(MODEL_IDS), n_bins)
+
+    def drift(self, reference, threshold=POSITIVE_THRESHOLD, bins=DRIFT_BINS, epsilon=1e-4):
+        current = self.histograms(bins).astype(np.float64)
+        baseline = reference.histograms(bins).astype(np.float64)
+        observed = (current.sum(axis=1) > 0) & (baseline.sum(axis=1) > 0)
+        current = current / np.maximum(current.sum(axis=1, keepdims=True), 1) + epsilon
+        baseline = baseline / np.maximum(baseline.sum(axis=1, keepdims=True), 1) + epsilon
+        psi = np.where(observed, ((current - baseline) * np.log(current / baseline)).sum(axis=1), np.nan)
+        return {
+            "mean_score_delta": self.mean_scores() - reference.mean_scores(),
+            "prevalence_delta": self.prevalence(threshold) - reference.prevalence(threshold),
+            "psi": psi,
+        }
+
+    def summary(self, threshold=POSITIVE_THRESHOLD, reference=None):
+        prevalence = self.prevalence(threshold)
+        mean_scores = self.mean_scores()
+        drift = self.drift(reference, threshold) if reference is not None else None
+        findings = {}
+        for index, finding in enumerate(FINDING_NAMES):
+            entry = {
+                "prevalence": _as_float(prevalence[index]),
+                "mean_score": _as_float(mean_scores[index]),
+            }
+            if drift is not None:
+                entry.update({name: _as_float(values[index]) for name, values in drift.items()})
+            findings[finding] = entry
+        return {"studies": len(self), "threshold": threshold, "findings": findings}
+
+    def to_npz(self, path):
+        np.savez_compressed(path, study_ids=self.study_ids, scores=self.scores, model_ids=np.asarray(MODEL_IDS))
+
+    @classmethod
+    def from_npz(cls, path):
+        with np.load(path) as data:
+            model_ids = tuple(data["model_ids"])
+            scores = data["scores"]
+            study_ids = data["study_ids"]
+        return cls(study_ids, _align_columns(model_ids, scores))
+
+    def to_parquet(self, path):
+        pa, pq = _require_pyarrow()
+        columns = {"study_id": pa.array(self.study_ids.tolist(), type=pa.string())}
+        for index, model_id in enumerate(MODEL_IDS):
+            columns[model_id] = pa.array(self.scores[:, index], type=pa.float32(), from_pandas=True)
+        pq.write_table(pa.table(columns), path)
+
+    @classmethod
+    def from_parquet(cls, path):
+        _, pq = _require_pyarrow()
+        table = pq.read_table(path)
+        model_ids = tuple(name for name in table.column_names if name != "study_id")
+        scores = np.column_stack([
+            table.column(model_id).to_numpy(zero_copy_only=False).astype(np.float32) for model_id in model_ids
+        ]) if model_ids else np.empty((table.num_rows, 0), dtype=np.float32)
+        return cls(table.column("study_id").to_pylist(), _align_columns(model_ids, scores))
+
+    def save(self, path):
+        if path.endswith(".parquet"):
+            self.to_parquet(path)
+        elif path.endswith(".npz"):
+            self.to_npz(path)
+        else:
+            raise ValueError(f"Unsupported cohort file type: {path} (use .npz or .parquet)")
+
+    @classmethod
+    def load(cls, path):
+        if path.endswith(".parquet"):
+            return cls.from_parquet(path)
+        if path.endswith(".npz"):
+            return cls.from_npz(path)
+        raise ValueError(f"Unsupported cohort file type: {path} (use .npz or .parquet)")
+
+
+def _as_float(value):
+    return None if np.isnan(value) else round(float(value), 4)
+
+
+def _align_columns(model_ids, scores):
+    if model_ids == MODEL_IDS:
+        return scores
+    aligned = np.full((scores.shape[0], len(MODEL_IDS)), np.nan, dtype=np.float32)
+    for column, model_id in enumerate(model_ids):
+        index = MODEL_INDEX.get(model_id)
+        if index is not None:
+            aligned[:, index] = scores[:, column]
+    return aligned
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet export requires pyarrow. Install it with: pip install pyarrow")
+    return pa, pq
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export and analyse classification scores across a cohort of studies.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Export stored results to a .npz or .parquet score matrix")
+    export_parser.add_argument("output", type=str, help="Output path (.npz or .parquet)")
+
+    stats_parser = subparsers.add_parser("stats", help="Per-finding prevalence and drift statistics")
+    stats_parser.add_argument("path", type=str, help="Score matrix (.npz or .parquet)")
+    stats_parser.add_argument("--reference", type=str, help="Baseline score matrix to compute drift against")
+    stats_parser.add_argument("--threshold", type=float, default=POSITIVE_THRESHOLD, help="Positive score threshold")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        cohort = CohortScores.from_results_store()
+        cohort.save(args.output)
+        print(f"Exported {len(cohort)} studies x {len(MODEL_IDS)} findings to {args.output} ({os.path.getsize(args.output)} bytes)")
+    else:
+        cohort = CohortScores.load(args.path)
+        reference = CohortScores.load(args.reference) if args.reference else None
+        print(json.dumps(cohort.summary(args.threshold, reference), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,7 @@ import { existsSync } from "fs"
 export async function POST(request: NextRequest) {
   try {
     const body = await request.json()
-    const { filepath, questionnaireData, pipelineOutput } = body
+    const { filepath, questionnaireData, pipelineOutput, scanId, priority } = body
 
     if (pipelineOutput) {
       console.log(`Running GPT analysis with provided pipeline output`)
@@ -19,7 +19,8 @@ export async function POST(request: NextRequest) {
         body: JSON.stringify({
           pipeline_output: pipelineOutput,
           filepath: filepath || '',
-          questionnaire_data: questionnaireData || null
+          questionnaire_data: questionnaireData || null,
+          scan_id: scanId || null
         })
       }).catch((fetchError) => {
         throw new Error(`Connection failed: ${fetchError.message}`)
@@ -39,6 +40,7 @@ export async function POST(request: NextRequest) {
       const analysisResults = {
         pipelineAnalysis: pipelineOutput,
         gptAnalysis: gptData.interpretation,
+        scanId: gptData.scan_id,
         questionnaireData: questionnaireData || null,
         filepath: filepath,
         timestamp: new Date().toISOString(),
@@ -73,12 +75,24 @@ export async function POST(request: NextRequest) {
         },
         body: JSON.stringify({
           filepath: filepath,
-          questionnaire_data: questionnaireData
+          questionnaire_data: questionnaireData,
+          scan_id: scanId || null,
+          priority: priority || null
         })
       }).catch((fetchError) => {
         throw new Error(`Connection failed: ${fetchError.message}`)
       })
 
+      if (analysisResponse.status === 503) {
+        const busyData = await analysisResponse.json().catch(() => ({}))
+        const retryAfter = analysisResponse.headers.get('Retry-After') || String(busyData.retry_after || 30)
+        return NextResponse.json({
+          error: "Server busy",
+          details: `The analysis server is at capacity. Estimated wait: ${busyData.estimated_wait_seconds ?? retryAfter} seconds.`,
+          retryAfter: Number(retryAfter)
+        }, { status: 503, headers: { 'Retry-After': retryAfter } })
+      }
+
       if (!analysisResponse.ok) {
         const errorData = await analysisResponse.json().catch(() => ({ error: 'Unknown error' }))
         throw new Error(`Medical API error: ${errorData.error || 'Unknown error'}`)
@@ -93,6 +107,7 @@ export async function POST(request: NextRequest) {
       const analysisResults = {
         pipelineAnalysis: analysisData.pipeline_analysis,
         gptAnalysis: analysisData.gpt_analysis,
+        scanId: analysisData.scan_id,
         questionnaireData: questionnaireData || null,
         filepath: filepath,
         timestamp: new Date().toISOString(),
@@ -93,10 +93,11 @@ async function startPipelineAnalysis(filepath: string, analysisId: string) {
       status: 'running',
       progress: 0,
       startTime: new Date().toISOString(),
+      scanId: analysisId,
       message: 'Starting pipeline analysis...'
     }))
 
-    const pipelineCommand = `python "${join(process.cwd(), '..', 'pipeline.py')}" "${filepath}"`
+    const pipelineCommand = `python "${join(process.cwd(), '..', 'pipeline.py')}" "${filepath}" --scan-id "${analysisId}"`
     const { stdout: pipelineOutputRaw, stderr: pipelineError } = await execAsync(pipelineCommand, {
       cwd: join(process.cwd(), '..'),
       encoding: 'utf8',
@@ -127,6 +128,7 @@ async function startPipelineAnalysis(filepath: string, analysisId: string) {
       status: 'completed',
       progress: 100,
       endTime: new Date().toISOString(),
+      scanId: analysisId,
       pipelineOutput: pipelineOutput,
       pipelineError: pipelineError,
       message: 'Pipeline analysis completed'
@@ -143,6 +145,7 @@ async function startPipelineAnalysis(filepath: string, analysisId: string) {
         status: 'error',
         progress: 0,
         endTime: new Date().toISOString(),
+        scanId: analysisId,
         error: error instanceof Error ? error.message : String(error),
         message: 'Pipeline analysis failed'
       }))
@@ -45,7 +45,7 @@ export default function ResultsPage() {
         const elapsed = Date.now() - (startTime || Date.now())
         if (elapsed > 300000) {
           console.warn('Pipeline timeout - proceeding with GPT analysis')
-          await runGPTAnalysis("Pipeline analysis timed out")
+          await runGPTAnalysis("Pipeline analysis timed out", analysisId)
           return
         }
 
@@ -62,14 +62,14 @@ export default function ResultsPage() {
         setProgress(90)
         setPipelineStatus({ ...status, message: 'Pipeline complete. Generating personalized report...' })
 
-        await runGPTAnalysis(status.pipelineOutput)
+        await runGPTAnalysis(status.pipelineOutput, status.scanId || analysisId)
       } else if (status.status === 'error') {
 
         setProgress(90)
         setPipelineStatus({ ...status, message: 'Pipeline completed with errors. Generating report...' })
         console.error('Pipeline failed:', status.error)
 
-        await runGPTAnalysis(status.pipelineOutput || "Pipeline analysis failed")
+        await runGPTAnalysis(status.pipelineOutput || "Pipeline analysis failed", status.scanId || analysisId)
       }
     } catch (error) {
       console.error('Status check failed:', error)
@@ -78,7 +78,7 @@ export default function ResultsPage() {
     }
   }
 
-  const runGPTAnalysis = async (pipelineOutput: string) => {
+  const runGPTAnalysis = async (pipelineOutput: string, scanId: string) => {
     let analysisResponse: Response | null = null
     
     try {
@@ -102,7 +102,8 @@ export default function ResultsPage() {
         body: JSON.stringify({
           filepath: uploadedFilePath,
           questionnaireData: questionnaireData ? JSON.parse(questionnaireData) : null,
-          pipelineOutput: pipelineOutput
+          pipelineOutput: pipelineOutput,
+          scanId: scanId
         }),
       })
       
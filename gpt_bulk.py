@@ -0,0 +1,237 @@
+import argparse
+import io
+import json
+import os
+import sys
+import time
+import uuid
+
+from gptapi import _extract_response_text, build_response_request, build_structured_prompt
+
+BATCH_ENDPOINT = "/v1/responses"
+BATCH_COMPLETION_WINDOW = "24h"
+BATCH_POLL_SECONDS = float(os.getenv("GPT_BATCH_POLL_SECONDS", "30"))
+BATCH_TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+class OpenAIBatchBackend:
+    def __init__(self, client=None):
+        if client is None:
+            from openai import OpenAI
+
+            client = OpenAI()
+        self.client = client
+
+    def submit(self, lines):
+        payload = "\n".join(json.dumps(line) for line in lines).encode("utf-8")
+        input_file = self.client.files.create(file=("bulk_reports.jsonl", io.BytesIO(payload)), purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=BATCH_COMPLETION_WINDOW,
+        )
+        return batch.id
+
+    def status(self, batch_id):
+        batch = self.client.batches.retrieve(batch_id)
+        return batch.status
+
+    def results(self, batch_id):
+        batch = self.client.batches.retrieve(batch_id)
+        lines = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            content = self.client.files.content(file_id).text
+            lines.extend(json.loads(line) for line in content.splitlines() if line.strip())
+        return lines
+
+
+class LocalBatchBackend:
+    def __init__(self, responder=None):
+        self.responder = responder or self._stub_response
+        self._batches = {}
+
+    @staticmethod
+    def _stub_response(body):
+        text = json.dumps({
+            "explanation": "Local batch stand-in report.",
+            "keyFindings": [],
+            "nextSteps": ["Review the findings with your healthcare provider"],
+            "severity": "normal",
+            "summary": "Generated locally without calling the OpenAI API.",
+        })
+        return {"output": [{"content": [{"type": "output_text", "text": text}]}]}
+
+    def submit(self, lines):
+        batch_id = f"local_batch_{uuid.uuid4().hex[:12]}"
+        results = []
+        for line in lines:
+            try:
+                body = self.responder(line["body"])
+                results.append({"custom_id": line["custom_id"], "response": {"status_code": 200, "body": body}, "error": None})
+            except Exception as e:
+                results.append({"custom_id": line["custom_id"], "response": None, "error": {"message": str(e)}})
+        self._batches[batch_id] = results
+        return batch_id
+
+    def status(self, batch_id):
+        return "completed" if batch_id in self._batches else "failed"
+
+    def results(self, batch_id):
+        return self._batches.get(batch_id, [])
+
+
+def build_batch_lines(items):
+    lines = []
+    seen = set()
+    for item in items:
+        custom_id = str(item["study_id"])
+        if custom_id in seen:
+            raise ValueError(f"Duplicate study_id in batch: {custom_id}")
+        seen.add(custom_id)
+        structured_prompt = build_structured_prompt(item["pipeline_output"], item.get("questionnaire_data"))
+        lines.append({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": build_response_request(structured_prompt),
+        })
+    return lines
+
+
+def submit_bulk_reports(items, backend):
+    lines = build_batch_lines(items)
+    batch_id = backend.submit(lines)
+    print(f"Submitted batch {batch_id} with {len(lines)} reports")
+    return batch_id
+
+
+def wait_for_bulk_reports(batch_id, backend, poll_seconds=BATCH_POLL_SECONDS, timeout=None):
+    deadline = None if timeout is None else time.monotonic() + timeout
+    status = backend.status(batch_id)
+    while status not in BATCH_TERMINAL_STATUSES:
+        if deadline is not None and time.monotonic() >= deadline:
+            raise TimeoutError(f"Batch {batch_id} still {status} after {timeout} seconds")
+        print(f"Batch {batch_id} is {status}, checking again in {poll_seconds:.0f}s")
+        time.sleep(poll_seconds)
+        status = backend.status(batch_id)
+    print(f"Batch {batch_id} finished with status: {status}")
+
+    reports = {}
+    for line in backend.results(batch_id):
+        study_id = line.get("custom_id")
+        response = line.get("response") or {}
+        if line.get("error") or response.get("status_code") != 200:
+            error = line.get("error") or (response.get("body") or {}).get("error") or "Unknown batch error"
+            reports[study_id] = {"success": False, "error": error}
+        else:
+            reports[study_id] = {"success": True, "text": _extract_response_text(response.get("body"))}
+    return status, reports
+
+
+def run_bulk_reports(items, backend, poll_seconds=BATCH_POLL_SECONDS, timeout=None):
+    batch_id = submit_bulk_reports(items, backend)
+    _, reports = wait_for_bulk_reports(batch_id, backend, poll_seconds, timeout)
+    for item in items:
+        reports.setdefault(str(item["study_id"]), {"success": False, "error": "No result returned for study"})
+    return reports
+
+
+def load_manifest_items(manifest_path):
+    entries = []
+    seen = set()
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if "study_id" not in entry:
+                raise ValueError(f"Manifest line {line_number} is missing study_id")
+            study_id = str(entry["study_id"])
+            if study_id in seen:
+                raise ValueError(f"Manifest line {line_number} repeats study_id {study_id}")
+            seen.add(study_id)
+            if not entry.get("pipeline_output") and not (entry.get("dicom_paths") or entry.get("dicom_path")):
+                raise ValueError(f"Manifest line {line_number} needs pipeline_output or dicom_paths")
+            entries.append(entry)
+
+    items = []
+    failed = {}
+    for entry in entries:
+        if not entry.get("pipeline_output"):
+            from pipeline import run_pipeline
+
+            try:
+                entry["pipeline_output"] = run_pipeline(entry.get("dicom_paths") or entry["dicom_path"], priority="bulk")
+            except Exception as e:
+                print(f"Pipeline failed for study {entry['study_id']}: {e}")
+                failed[str(entry["study_id"])] = {"success": False, "error": f"Pipeline failed: {e}"}
+                continue
+        items.append(entry)
+    return items, failed
+
+
+def load_pending_store_items(limit):
+    from results_store import ResultsStore
+
+    store = ResultsStore()
+    items = [
+        {
+            "study_id": f"result-{record['id']}",
+            "result_id": record["id"],
+            "pipeline_output": record["pipeline_output"],
+            "questionnaire_data": record["questionnaire_data"],
+        }
+        for record in store.list_pending_gpt(limit)
+    ]
+    return store, items
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate GPT reports for many studies through the asynchronous batch API."
+    )
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--manifest", type=str, help="JSONL file with study_id and pipeline_output (or dicom_paths) per line")
+    source.add_argument("--from-results", type=int, metavar="LIMIT", help="Report on up to LIMIT stored results that have no GPT output yet")
+    parser.add_argument("--output", type=str, help="Write the reports as JSON to this path")
+    parser.add_argument("--local", action="store_true", help="Use the local batch stand-in instead of the OpenAI API")
+    parser.add_argument("--poll-seconds", type=float, default=BATCH_POLL_SECONDS, help="Seconds between batch status checks")
+    parser.add_argument("--timeout", type=float, help="Give up waiting after this many seconds")
+    args = parser.parse_args()
+
+    store = None
+    failed = {}
+    if args.manifest:
+        items, failed = load_manifest_items(args.manifest)
+    else:
+        store, items = load_pending_store_items(args.from_results)
+    if not items and not failed:
+        print("No studies to report on")
+        return
+
+    reports = {}
+    if items:
+        backend = LocalBatchBackend() if args.local else OpenAIBatchBackend()
+        reports = run_bulk_reports(items, backend, args.poll_seconds, args.timeout)
+    reports.update(failed)
+
+    if store is not None:
+        for item in items:
+            report = reports[item["study_id"]]
+            if report["success"]:
+                store.set_gpt_output(item["result_id"], report["text"])
+
+    succeeded = sum(1 for report in reports.values() if report["success"])
+    print(f"Generated {succeeded}/{len(reports)} reports")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
+        print(f"Reports written to {args.output}")
+    elif store is None:
+        json.dump(reports, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,3 @@
-from openai import OpenAI
-from pipeline import run_pipeline
 import sys
 import os
 
@@ -58,18 +56,7 @@ def _extract_response_text(resp) -> str:
         return ""
 
 
-def main(pipeline_output: str | None = None, dicom_path: str | None = None, questionnaire_data: dict | None = None):
-    if pipeline_output:
-        formatted_output = pipeline_output
-    else:
-        if dicom_path is None:
-            dicom_path = "Atelectasis/train/0b1b897b1e1e170f1b5fd7aeff553afa.dcm"
-
-        if not os.path.exists(dicom_path):
-            raise FileNotFoundError(f"DICOM file not found at: {dicom_path}")
-
-        formatted_output = run_pipeline(dicom_path)
-
+def build_structured_prompt(formatted_output: str, questionnaire_data: dict | None = None) -> str:
     questionnaire_context = ""
     if questionnaire_data:
         questionnaire_context = f"""
@@ -153,9 +140,11 @@ Example structure (notice how it COMBINES scan findings with patient context):
 Now provide your analysis in the exact JSON format above:
 
 """
+    return structured_prompt
 
-    client = OpenAI()
-    response = client.responses.create(
+
+def build_response_request(structured_prompt: str) -> dict:
+    return dict(
         prompt={
             "id": PROMPT_ID,
             "version": "1",
@@ -182,6 +171,28 @@ Now provide your analysis in the exact JSON format above:
         include=["web_search_call.action.sources"],
     )
 
+
+def main(pipeline_output: str | None = None, dicom_path: str | None = None, questionnaire_data: dict | None = None):
+    if pipeline_output:
+        formatted_output = pipeline_output
+    else:
+        if dicom_path is None:
+            dicom_path = "Atelectasis/train/0b1b897b1e1e170f1b5fd7aeff553afa.dcm"
+
+        if not os.path.exists(dicom_path):
+            raise FileNotFoundError(f"DICOM file not found at: {dicom_path}")
+
+        from pipeline import run_pipeline
+
+        formatted_output = run_pipeline(dicom_path)
+
+    structured_prompt = build_structured_prompt(formatted_output, questionnaire_data)
+
+    from openai import OpenAI
+
+    client = OpenAI()
+    response = client.responses.create(**build_response_request(structured_prompt))
+
     text = _extract_response_text(response)
 
     print("\n=== GPT MODEL OUTPUT ===\n")
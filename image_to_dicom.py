@@ -2,7 +2,6 @@ import argparse
 import pydicom
 from pydicom.dataset import Dataset, FileDataset
 from pydicom.uid import generate_uid
-from pydicom.data import get_testdata_file
 import numpy as np
 from PIL import Image
 import os
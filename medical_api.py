@@ -4,16 +4,25 @@ import os
 import sys
 import traceback
 import json
+import time
+import uuid
 from datetime import datetime
+from functools import wraps
 from dotenv import load_dotenv
-from pipeline import run_pipeline
-from gptapi import main as gpt_main
 
 load_dotenv()
 
+from singleflight import SingleFlight, hash_files, make_key
+from results_store import ResultsStore
+from admission import AdmissionController, AdmissionRejected
+from priority import normalize_priority
+
 app = Flask(__name__)
 CORS(app)
 DEMO_MODE = os.getenv('DEMO_MODE', 'false').lower() == 'true'
+analysis_flights = SingleFlight()
+results_store = ResultsStore()
+admission = AdmissionController()
 
 print(f"\n{'='*50}")
 print(f"DEMO_MODE Status: {DEMO_MODE}")
@@ -25,12 +34,97 @@ else:
     print("clario medical imaging analysis and GPT APIs will be called with actual data")
 print(f"{'='*50}\n")
 
-def get_mock_pipeline_analysis(filepath):
+def get_request_filepaths(data):
+    if not data or not isinstance(data, dict):
+        return None
+    filepaths = data.get('filepaths')
+    if filepaths is None and 'filepath' in data:
+        filepaths = [data['filepath']]
+    if not filepaths or not isinstance(filepaths, list):
+        return None
+    if not all(isinstance(filepath, str) and filepath for filepath in filepaths):
+        return None
+    return filepaths
+
+def get_missing_filepath(filepaths):
+    for filepath in filepaths:
+        if not os.path.exists(filepath):
+            return filepath
+    return None
+
+def validate_analysis_request(data):
+    filepaths = get_request_filepaths(data)
+    if not filepaths:
+        return jsonify({'error': 'filepath or filepaths (non-empty path strings) is required'}), 400
+    missing_filepath = get_missing_filepath(filepaths)
+    if missing_filepath:
+        return jsonify({'error': f'File not found: {missing_filepath}'}), 404
+    try:
+        normalize_priority(data.get('priority'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return None
+
+def admission_controlled(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        data = request.get_json(silent=True)
+        error_response = validate_analysis_request(data)
+        if error_response:
+            return error_response
+        try:
+            return view(*args, **kwargs)
+        except AdmissionRejected as rejected:
+            print(f"Rejected {request.path}: {rejected.reason} (retry after {rejected.retry_after}s)")
+            return jsonify({
+                'success': False,
+                'error': 'Server busy',
+                'details': rejected.reason,
+                'retry_after': rejected.retry_after,
+                'estimated_wait_seconds': rejected.estimated_wait
+            }), 503, {'Retry-After': str(rejected.retry_after)}
+    return wrapper
+
+def get_request_scan_id(data):
+    return (data or {}).get('scan_id') or f"scan_{uuid.uuid4().hex[:12]}"
+
+def run_pipeline_coalesced(filepaths, content_hash, priority):
+    from pipeline import run_pipeline_details
+
+    def run_admitted():
+        with admission.admitted(priority):
+            return run_pipeline_details(filepaths, priority, use_pool=True)
+
+    key = make_key('pipeline', content_hash)
+    pipeline_details, coalesced = analysis_flights.do(key, run_admitted)
+    if coalesced:
+        print(f"Attached to in-flight pipeline analysis {key[:24]}")
+    return pipeline_details
+
+def run_gpt_coalesced(pipeline_output, questionnaire_data):
+    from gptapi import main as gpt_main
+
+    key = make_key('gpt', pipeline_output, questionnaire_data)
+    gpt_result, coalesced = analysis_flights.do(
+        key, lambda: gpt_main(pipeline_output=pipeline_output, questionnaire_data=questionnaire_data)
+    )
+    if coalesced:
+        print(f"Attached to in-flight GPT analysis {key[:24]}")
+    return gpt_result
+
+def save_analysis_result(scan_id, **fields):
+    try:
+        return results_store.save_result(scan_id, **fields)
+    except Exception as store_error:
+        print(f"Failed to save results for {scan_id}: {str(store_error)}")
+        return None
+
+def get_mock_pipeline_analysis(filepaths):
     return f"""
 DICOM File Analysis Report
 ==========================
 
-File: {os.path.basename(filepath)}
+Files: {', '.join(os.path.basename(p) for p in filepaths)}
 Analysis Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 
 TECHNICAL PARAMETERS:
@@ -93,39 +187,83 @@ Note: This is a demonstration analysis for testing purposes.
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({'status': 'healthy', 'service': 'medical_api'})
+    admission_stats = admission.stats()
+    saturated = (
+        admission_stats['active'] >= admission.max_concurrent
+        and admission_stats['queue_depth'] >= admission.max_queue_depth
+    )
+    return jsonify({
+        'status': 'busy' if saturated else 'healthy',
+        'service': 'medical_api',
+        'admission': admission_stats
+    })
+
+@app.route('/metrics/coalescing', methods=['GET'])
+def coalescing_metrics():
+    return jsonify(analysis_flights.metrics())
+
+@app.route('/metrics/study-pool', methods=['GET'])
+def study_pool_metrics():
+    from study_pool import STUDY_POOL_SIZE
+    if STUDY_POOL_SIZE <= 0 or DEMO_MODE:
+        return jsonify({'enabled': False})
+    from pipeline import current_study_pool
+    study_pool = current_study_pool()
+    if study_pool is None:
+        return jsonify({'enabled': True, 'started': False})
+    return jsonify(study_pool.stats())
 
 @app.route('/analyze/pipeline', methods=['POST'])
+@admission_controlled
 def analyze_pipeline():
     try:
         data = request.json
-        if not data or 'filepath' not in data:
-            return jsonify({'error': 'filepath is required'}), 400
+        filepaths = get_request_filepaths(data)
+        filepath = filepaths[0]
         
-        filepath = data['filepath']
-        
-        if not os.path.exists(filepath):
-            return jsonify({'error': f'File not found: {filepath}'}), 404
-        
-        print(f"Running pipeline analysis on: {filepath}")
+        print(f"Running pipeline analysis on: {', '.join(filepaths)}")
+        scan_id = get_request_scan_id(data)
+        content_hash = hash_files(filepaths)
+        priority = normalize_priority(data.get('priority'))
+        pipeline_details = {}
         
         if DEMO_MODE:
             print("DEMO MODE: Using mock pipeline analysis")
-            pipeline_result = get_mock_pipeline_analysis(filepath)
+            pipeline_result = get_mock_pipeline_analysis(filepaths)
         else:
             try:
-                pipeline_result = run_pipeline(filepath)
+                pipeline_details = run_pipeline_coalesced(filepaths, content_hash, priority)
+                pipeline_result = pipeline_details['formatted_output']
+            except AdmissionRejected:
+                raise
             except Exception as pipeline_error:
                 print(f"Pipeline execution failed: {str(pipeline_error)}")
                 pipeline_result = f"Pipeline analysis encountered an error: {str(pipeline_error)}. Using fallback analysis mode."
         
+        result_id = save_analysis_result(
+            scan_id,
+            content_hash=content_hash,
+            filepaths=filepaths,
+            classification=pipeline_details.get('classification'),
+            vlm_output=pipeline_details.get('vlm_output'),
+            pipeline_output=pipeline_result,
+            timings=pipeline_details.get('timings'),
+        )
+        
         return jsonify({
             'success': True,
             'analysis': pipeline_result,
+            'scan_id': scan_id,
+            'result_id': result_id,
+            'content_hash': content_hash,
+            'priority': priority,
             'filepath': filepath,
+            'filepaths': filepaths,
             'timestamp': datetime.now().isoformat()
         })
         
+    except AdmissionRejected:
+        raise
     except Exception as e:
         print(f"Pipeline analysis error: {str(e)}")
         traceback.print_exc()
@@ -150,11 +288,33 @@ def analyze_gpt():
         if questionnaire_data:
             print("Including questionnaire data for personalized analysis")
         
-        gpt_result = gpt_main(pipeline_output=pipeline_output, questionnaire_data=questionnaire_data)
+        gpt_start = time.perf_counter()
+        gpt_result = run_gpt_coalesced(pipeline_output, questionnaire_data)
+        gpt_seconds = round(time.perf_counter() - gpt_start, 3)
+        
+        scan_id = data.get('scan_id')
+        result_id = None
+        if scan_id:
+            try:
+                result_id = results_store.update_gpt_output(scan_id, gpt_result, questionnaire_data, gpt_seconds)
+            except Exception as store_error:
+                print(f"Failed to update results for {scan_id}: {str(store_error)}")
+        if result_id is None:
+            scan_id = scan_id or get_request_scan_id(data)
+            result_id = save_analysis_result(
+                scan_id,
+                filepaths=[filepath] if filepath else None,
+                pipeline_output=pipeline_output,
+                gpt_output=gpt_result,
+                questionnaire_data=questionnaire_data,
+                timings={'gpt_seconds': gpt_seconds},
+            )
         
         return jsonify({
             'success': True,
             'interpretation': gpt_result,
+            'scan_id': scan_id,
+            'result_id': result_id,
             'filepath': filepath,
             'timestamp': datetime.now().isoformat()
         })
@@ -169,27 +329,30 @@ def analyze_gpt():
         }), 500
 
 @app.route('/analyze/complete', methods=['POST'])
+@admission_controlled
 def analyze_complete():
     try:
         data = request.json
-        if not data or 'filepath' not in data:
-            return jsonify({'error': 'filepath is required'}), 400
-        
-        filepath = data['filepath']
+        filepaths = get_request_filepaths(data)
+        filepath = filepaths[0]
         questionnaire_data = data.get('questionnaire_data')
         
-        if not os.path.exists(filepath):
-            return jsonify({'error': f'File not found: {filepath}'}), 404
-        
-        print(f"Running complete analysis on: {filepath}")
+        print(f"Running complete analysis on: {', '.join(filepaths)}")
+        scan_id = get_request_scan_id(data)
+        content_hash = hash_files(filepaths)
+        priority = normalize_priority(data.get('priority'))
+        pipeline_details = {}
         
         print("Step 1: Running pipeline analysis...")
         if DEMO_MODE:
             print("DEMO MODE: Using mock pipeline analysis")
-            pipeline_result = get_mock_pipeline_analysis(filepath)
+            pipeline_result = get_mock_pipeline_analysis(filepaths)
         else:
             try:
-                pipeline_result = run_pipeline(filepath)
+                pipeline_details = run_pipeline_coalesced(filepaths, content_hash, priority)
+                pipeline_result = pipeline_details['formatted_output']
+            except AdmissionRejected:
+                raise
             except Exception as pipeline_error:
                 print(f"Pipeline failed: {str(pipeline_error)}")
                 pipeline_result = f"Pipeline analysis failed due to external service timeout. Error: {str(pipeline_error)}. Proceeding with GPT analysis using file information only."
@@ -197,25 +360,47 @@ def analyze_complete():
         print("Step 2: Running GPT analysis...")
         if questionnaire_data:
             print("Including questionnaire data for personalized analysis")
+        gpt_start = time.perf_counter()
         if DEMO_MODE:
             print("DEMO MODE: Using mock GPT analysis")
             gpt_result = get_mock_gpt_analysis()
         else:
             try:
-                gpt_result = gpt_main(pipeline_output=pipeline_result, questionnaire_data=questionnaire_data)
+                gpt_result = run_gpt_coalesced(pipeline_result, questionnaire_data)
             except Exception as gpt_error:
                 print(f"GPT analysis failed: {str(gpt_error)}")
                 gpt_result = "GPT analysis unavailable. Please consult with a healthcare professional for proper medical evaluation."
+        timings = dict(pipeline_details.get('timings') or {})
+        timings['gpt_seconds'] = round(time.perf_counter() - gpt_start, 3)
+        
+        result_id = save_analysis_result(
+            scan_id,
+            content_hash=content_hash,
+            filepaths=filepaths,
+            classification=pipeline_details.get('classification'),
+            vlm_output=pipeline_details.get('vlm_output'),
+            pipeline_output=pipeline_result,
+            gpt_output=gpt_result,
+            questionnaire_data=questionnaire_data,
+            timings=timings,
+        )
         
         return jsonify({
             'success': True,
             'pipeline_analysis': pipeline_result,
             'gpt_analysis': gpt_result,
+            'scan_id': scan_id,
+            'result_id': result_id,
+            'content_hash': content_hash,
+            'priority': priority,
             'questionnaire_data': questionnaire_data,
             'filepath': filepath,
+            'filepaths': filepaths,
             'timestamp': datetime.now().isoformat()
         })
         
+    except AdmissionRejected:
+        raise
     except Exception as e:
         print(f"Complete analysis error: {str(e)}")
         traceback.print_exc()
@@ -225,6 +410,32 @@ def analyze_complete():
             'traceback': traceback.format_exc()
         }), 500
 
+@app.route('/results', methods=['GET'])
+def list_results():
+    try:
+        page = results_store.list_results(
+            limit=request.args.get('limit', 50, type=int),
+            cursor=request.args.get('cursor', type=int),
+            content_hash=request.args.get('content_hash'),
+            since=request.args.get('since'),
+            until=request.args.get('until'),
+        )
+        return jsonify(page)
+    except Exception as e:
+        print(f"Results listing error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/results/<scan_id>', methods=['GET'])
+def get_result(scan_id):
+    try:
+        record = results_store.get_by_scan_id(scan_id)
+        if record is None:
+            return jsonify({'error': f'No results found for scan: {scan_id}'}), 404
+        return jsonify(record)
+    except Exception as e:
+        print(f"Results lookup error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({'error': 'Endpoint not found'}), 404
@@ -237,9 +448,19 @@ if __name__ == '__main__':
     print("Starting Medical Analysis API Server...")
     print("Available endpoints:")
     print("  GET  /health - Health check")
+    print("  GET  /metrics/coalescing - In-flight request coalescing metrics")
+    print("  GET  /metrics/study-pool - Pre-created study pool metrics")
     print("  POST /analyze/pipeline - Run pipeline analysis")
     print("  POST /analyze/gpt - Run GPT analysis")
     print("  POST /analyze/complete - Run both pipeline and GPT")
+    print("  GET  /results - List stored results (paginated)")
+    print("  GET  /results/<scan_id> - Get stored result for a scan")
     print("\nServer running on http://localhost:8000")
     
+    if not DEMO_MODE and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        from pipeline import get_study_pool
+        study_pool = get_study_pool()
+        if study_pool is not None:
+            print(f"Warming pool of {study_pool.size} pre-created studies")
+    
     app.run(host='0.0.0.0', port=8000, debug=True)
\ No newline at end of file
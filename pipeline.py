@@ -1,12 +1,23 @@
 import argparse
 import asyncio
 import os
-from typing import Optional
+import sys
+import threading
+import time
+from typing import List, Union
 from dotenv import load_dotenv
-from hopprai import HOPPR
+from priority import DEFAULT_PRIORITY, PRIORITY_LANES, PrioritySemaphore
+from study_pool import STUDY_POOL_SIZE, StudyPool
 
 load_dotenv()
 
+MAX_CONCURRENT_MODEL_CALLS = int(os.getenv("MAX_CONCURRENT_MODEL_CALLS", "32"))
+model_dispatch = PrioritySemaphore(MAX_CONCURRENT_MODEL_CALLS)
+
+STUDY_REFERENCE = "my-study-reference-123"
+_study_pool = None
+_study_pool_lock = threading.Lock()
+
 MODEL_ID_TO_FINDING = {
     "mc_chestradiography_air_space_opacity:v1.20250828": "Air Space Opacity",
     "mc_chestradiography_atelectasis:v1.20250828": "Atelectasis",
@@ -35,8 +46,16 @@ MODEL_ID_TO_FINDING = {
 }
 
 
-async def run_model(hoppr, study_id, model_id, prompt):
+def failed_score(reason):
+    return {"score": None, "positive": False, "error": reason}
+
+
+async def run_model(hoppr, study_id, model_id, prompt, priority=DEFAULT_PRIORITY):
     def call_model():
+        with model_dispatch.slot(priority):
+            return send_prompt()
+
+    def send_prompt():
         if model_id == "cxr-vlm-experimental":
             return hoppr.prompt_model(
                 study_id,
@@ -60,14 +79,14 @@ async def run_model(hoppr, study_id, model_id, prompt):
         if model_id == "cxr-vlm-experimental":
             return {"vlm_output": "Model response unavailable"}
         else:
-            return {model_id: {"score": 0.0, "positive": False}}
+            return {model_id: failed_score("No response received")}
     
     if not hasattr(response, 'response') or response.response is None:
         print(f"Warning: Invalid response format for model {model_id}")
         if model_id == "cxr-vlm-experimental":
             return {"vlm_output": "Model response format invalid"}
         else:
-            return {model_id: {"score": 0.0, "positive": False}}
+            return {model_id: failed_score("Invalid response format")}
     
     payload = response.response
 
@@ -83,11 +102,11 @@ async def run_model(hoppr, study_id, model_id, prompt):
     except (KeyError, ValueError, TypeError) as e:
         print(f"Warning: Failed to parse payload for model {model_id}: {e}")
         print(f"Payload: {payload}")
-        return {model_id: {"score": 0.0, "positive": False}}
+        return {model_id: failed_score(f"Failed to parse payload: {e}")}
 
 
-async def run_tier(hoppr, study_id, model_ids):
-    tasks = [run_model(hoppr, study_id, m, prompt="") for m in model_ids]
+async def run_tier(hoppr, study_id, model_ids, priority=DEFAULT_PRIORITY):
+    tasks = [run_model(hoppr, study_id, m, prompt="", priority=priority) for m in model_ids]
     
     try:
         results = await asyncio.gather(*tasks, return_exceptions=True)
@@ -99,14 +118,14 @@ async def run_tier(hoppr, study_id, model_ids):
     for i, item in enumerate(results):
         if isinstance(item, Exception):
             print(f"Model {model_ids[i]} failed with error: {item}")
-            classification[model_ids[i]] = {"score": 0.0, "positive": False}
+            classification[model_ids[i]] = failed_score(str(item))
         elif item and isinstance(item, dict):
             classification.update(item)
     return classification
 
 
-async def analyse_study(hoppr, study_id, tiers, vlm_prompt):
-    vlm_result = await run_model(hoppr, study_id, "cxr-vlm-experimental", vlm_prompt)
+async def analyse_study(hoppr, study_id, tiers, vlm_prompt, priority=DEFAULT_PRIORITY):
+    vlm_result = await run_model(hoppr, study_id, "cxr-vlm-experimental", vlm_prompt, priority)
     vlm_output = vlm_result["vlm_output"]
 
     classification = {}
@@ -114,8 +133,11 @@ async def analyse_study(hoppr, study_id, tiers, vlm_prompt):
         if not tier_models:
             continue
         print(f"\n--- Running tier {i} models: {tier_models} ---")
-        tier_results = await run_tier(hoppr, study_id, tier_models)
+        tier_results = await run_tier(hoppr, study_id, tier_models, priority)
         for model_name, info in tier_results.items():
+            if info["score"] is None:
+                print(f"  {model_name}: unavailable ({info['error']})")
+                continue
             score = info["score"]
             positive = info["positive"]
             print(f"  {model_name}: score={score:.3f}, positive={positive}")
@@ -124,13 +146,59 @@ async def analyse_study(hoppr, study_id, tiers, vlm_prompt):
     return vlm_output, classification
 
 
-def format_analysis_results(classification, vlm_output):
+async def upload_images(hoppr, study_id, dicom_paths):
+    async def upload_image(index, dicom_path):
+        def read_and_upload():
+            with open(dicom_path, "rb") as f:
+                image_data = f.read()
+            return hoppr.add_study_image(study_id, f"image-{index:03d}", image_data)
+
+        image = await asyncio.to_thread(read_and_upload)
+        print(f"Added image: {image.id} ({os.path.basename(dicom_path)})")
+        return image
+
+    tasks = [upload_image(i, p) for i, p in enumerate(dicom_paths, start=1)]
+    return await asyncio.gather(*tasks)
+
+
+async def run_study(
+    hoppr,
+    study_id,
+    dicom_paths,
+    tiers,
+    vlm_prompt,
+    timings=None,
+    priority=DEFAULT_PRIORITY,
+    recreate_study=None,
+):
+    timings = timings if timings is not None else {}
+    start = time.perf_counter()
+    try:
+        await upload_images(hoppr, study_id, dicom_paths)
+    except Exception as e:
+        if recreate_study is None:
+            raise
+        print(f"Upload to pooled study {study_id} failed ({e}), retrying with a new study")
+        study_id = (await asyncio.to_thread(recreate_study)).id
+        await upload_images(hoppr, study_id, dicom_paths)
+    timings["upload_seconds"] = round(time.perf_counter() - start, 3)
+
+    start = time.perf_counter()
+    vlm_output, classification = await analyse_study(hoppr, study_id, tiers, vlm_prompt, priority)
+    timings["analysis_seconds"] = round(time.perf_counter() - start, 3)
+    return vlm_output, classification
+
+
+def format_analysis_results(classification, vlm_output, image_paths=None):
     positive_findings = []
     negative_findings = []
+    unavailable_findings = []
     for model_name, info in classification.items():
         finding_name = MODEL_ID_TO_FINDING.get(model_name, model_name)
         score = info["score"]
-        if info["positive"]:
+        if score is None:
+            unavailable_findings.append(f"- {finding_name}: unavailable")
+        elif info["positive"]:
             positive_findings.append(f"- {finding_name}: {score:.3f}")
         else:
             negative_findings.append(f"- {finding_name}: {score:.3f}")
@@ -139,6 +207,12 @@ def format_analysis_results(classification, vlm_output):
         "CHEST X-RAY ANALYSIS REPORT",
         "=" * 40,
         "",
+    ]
+    if image_paths:
+        lines.append(f"INPUT IMAGES ({len(image_paths)}):")
+        lines.extend(f"- {os.path.basename(p)}" for p in image_paths)
+        lines.append("")
+    lines.extend([
         "FINDINGS EXPLANATION:",
         "- POSITIVE FINDINGS: Abnormalities detected with high confidence (score > 0.5)",
         "  These indicate the presence of the medical condition in the chest X-ray",
@@ -146,7 +220,7 @@ def format_analysis_results(classification, vlm_output):
         "  These indicate the absence of the medical condition in the chest X-ray",
         "",
         "POSITIVE FINDINGS (Detected Abnormalities):",
-    ]
+    ])
     if positive_findings:
         lines.extend(positive_findings)
     else:
@@ -161,6 +235,13 @@ def format_analysis_results(classification, vlm_output):
     else:
         lines.append("- All analyzed conditions were detected as present")
 
+    if unavailable_findings:
+        lines.extend([
+            "",
+            "UNAVAILABLE FINDINGS (Model Error, Not Assessed):",
+        ])
+        lines.extend(unavailable_findings)
+
     lines.extend([
         "",
         "RADIOLOGIST VLM NARRATIVE:",
@@ -168,9 +249,13 @@ def format_analysis_results(classification, vlm_output):
         vlm_output,
         "",
         "SUMMARY:",
-        f"- Total conditions analyzed: {len(classification)}",
+        f"- Total conditions analyzed: {len(positive_findings) + len(negative_findings)}",
         f"- Abnormalities detected: {len(positive_findings)}",
         f"- Conditions ruled out: {len(negative_findings)}",
+    ])
+    if unavailable_findings:
+        lines.append(f"- Conditions not assessed: {len(unavailable_findings)}")
+    lines.extend([
         "",
         "INTERPRETATION GUIDE:",
         "- Scores range from 0.0 to 1.0 (0% to 100% confidence)",
@@ -185,25 +270,72 @@ def format_analysis_results(classification, vlm_output):
     return output
 
 
-def run_pipeline(
-    dicom_path: str,
-):
-    
+def create_hoppr_client():
     api_key = os.getenv("HOPPR_API_KEY", "RmTQz4CowITpnjNdBAFbvjRaMlyARl9g3WUWVIhu")
     base_url = "https://api.hoppr.ai"
 
     if not api_key or api_key == "":
         raise ValueError("HOPPR_API_KEY environment variable is required. Please set it in your .env file or environment.")
 
-    hoppr = HOPPR(api_key=api_key, base_url=base_url)
+    from hopprai import HOPPR
+
+    return HOPPR(api_key=api_key, base_url=base_url)
+
+
+def get_study_pool():
+    global _study_pool
+    if STUDY_POOL_SIZE <= 0:
+        return None
+    with _study_pool_lock:
+        if _study_pool is None:
+            pool_client = create_hoppr_client()
+            delete_study = getattr(pool_client, "delete_study", None)
+            _study_pool = StudyPool(
+                lambda: pool_client.create_study(STUDY_REFERENCE),
+                discard_study=(lambda study: delete_study(study.id)) if delete_study else None,
+            )
+    return _study_pool
+
 
-    study = hoppr.create_study("my-study-reference-123")
-    print(f"Created study: {study.id}")
+def current_study_pool():
+    return _study_pool
 
-    with open(dicom_path, "rb") as f:
-        image_data = f.read()
-    image = hoppr.add_study_image(study.id, "image-001", image_data)
-    print(f"Added image: {image.id}")
+
+def run_pipeline(
+    dicom_path: Union[str, List[str]],
+    priority: str = DEFAULT_PRIORITY,
+    use_pool: bool = False,
+):
+    return run_pipeline_details(dicom_path, priority, use_pool)["formatted_output"]
+
+
+def run_pipeline_details(
+    dicom_path: Union[str, List[str]],
+    priority: str = DEFAULT_PRIORITY,
+    use_pool: bool = False,
+):
+    pipeline_start = time.perf_counter()
+    timings = {}
+    dicom_paths = [dicom_path] if isinstance(dicom_path, str) else list(dicom_path)
+    if not dicom_paths:
+        raise ValueError("At least one DICOM file is required to run the pipeline.")
+
+    hoppr = create_hoppr_client()
+
+    start = time.perf_counter()
+    study_pool = get_study_pool() if use_pool else None
+    study = study_pool.take() if study_pool else None
+    if study is not None:
+        print(f"Using pre-created study: {study.id}")
+
+        def recreate_study():
+            study_pool.mark_rejected(study)
+            return hoppr.create_study(STUDY_REFERENCE)
+    else:
+        study = hoppr.create_study(STUDY_REFERENCE)
+        recreate_study = None
+        print(f"Created study: {study.id}")
+    timings["create_study_seconds"] = round(time.perf_counter() - start, 3)
 
     tier1 = [
         "mc_chestradiography_pneumothorax:v1.20250828",
@@ -242,35 +374,70 @@ def run_pipeline(
     )
 
     vlm_output, classification = asyncio.run(
-        analyse_study(
+        run_study(
             hoppr=hoppr,
             study_id=study.id,
+            dicom_paths=dicom_paths,
             tiers=tiers,
             vlm_prompt=vlm_prompt,
+            timings=timings,
+            priority=priority,
+            recreate_study=recreate_study,
         )
     )
 
-    formatted_output = format_analysis_results(classification, vlm_output)
+    formatted_output = format_analysis_results(classification, vlm_output, dicom_paths)
 
     print("\n" + "=" * 80)
     print("FORMATTED OUTPUT FOR GPT:")
     print("=" * 80)
-    
-    return formatted_output
+
+    timings["total_seconds"] = round(time.perf_counter() - pipeline_start, 3)
+    return {
+        "formatted_output": formatted_output,
+        "classification": classification,
+        "vlm_output": vlm_output,
+        "image_paths": dicom_paths,
+        "timings": timings,
+    }
+
+
+def save_pipeline_result(scan_id, details):
+    from results_store import ResultsStore
+    from singleflight import hash_files
+
+    try:
+        result_id = ResultsStore().save_result(
+            scan_id,
+            content_hash=hash_files(details["image_paths"]),
+            filepaths=details["image_paths"],
+            classification=details["classification"],
+            vlm_output=details["vlm_output"],
+            pipeline_output=details["formatted_output"],
+            timings=details["timings"],
+        )
+        print(f"Saved results for {scan_id} (result {result_id})", file=sys.stderr)
+    except Exception as e:
+        print(f"Failed to save results for {scan_id}: {e}", file=sys.stderr)
 
 
 def main():
-    import sys
-    import io
-    
-    
     parser = argparse.ArgumentParser(
         description="Run Hoppr models on a DICOM file with tiered inference."
     )
-    parser.add_argument("dicom_path", type=str, help="Path to the DICOM file")
+    parser.add_argument("dicom_paths", type=str, nargs="+", help="Path(s) to the DICOM file(s) of one study")
+    parser.add_argument(
+        "--priority",
+        choices=PRIORITY_LANES,
+        default=DEFAULT_PRIORITY,
+        help="Priority lane used when dispatching model calls",
+    )
+    parser.add_argument("--scan-id", type=str, help="Save the structured results to the results store under this scan id")
     args = parser.parse_args()
-    output = run_pipeline(args.dicom_path)
-    print(output)
+    details = run_pipeline_details(args.dicom_paths, args.priority)
+    if args.scan_id:
+        save_pipeline_result(args.scan_id, details)
+    print(details["formatted_output"])
 
 
 if __name__ == "__main__":
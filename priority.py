@@ -0,0 +1,114 @@
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PRIORITY_LANES = ("stat", "routine", "bulk")
+DEFAULT_PRIORITY = "routine"
+STARVATION_AGING_SECONDS = float(os.getenv("STARVATION_AGING_SECONDS", "30"))
+
+
+def normalize_priority(value):
+    if value is None or value == "":
+        return DEFAULT_PRIORITY
+    lane = str(value).strip().lower()
+    if lane not in PRIORITY_LANES:
+        raise ValueError(f"priority must be one of: {', '.join(PRIORITY_LANES)}")
+    return lane
+
+
+def percentiles(values, points=(50, 90, 99)):
+    if not values:
+        return {f"p{p}": None for p in points}
+    ordered = sorted(values)
+    result = {}
+    for p in points:
+        index = min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))
+        result[f"p{p}"] = round(ordered[index], 3)
+    return result
+
+
+class QueueFull(Exception):
+    pass
+
+
+class _Waiter:
+    def __init__(self, lane):
+        self.lane = lane
+        self.enqueued_at = time.monotonic()
+
+
+class PrioritySemaphore:
+    def __init__(self, capacity, aging_seconds=STARVATION_AGING_SECONDS):
+        self.capacity = max(1, capacity)
+        self.aging_seconds = aging_seconds
+        self._cond = threading.Condition()
+        self._queues = {lane: deque() for lane in PRIORITY_LANES}
+        self._active = 0
+
+    def _next_waiter(self, now):
+        best = None
+        best_rank = None
+        for index, lane in enumerate(PRIORITY_LANES):
+            queue = self._queues[lane]
+            if not queue:
+                continue
+            waiter = queue[0]
+            boost = int((now - waiter.enqueued_at) // self.aging_seconds) if self.aging_seconds > 0 else 0
+            rank = (index - boost, waiter.enqueued_at)
+            if best_rank is None or rank < best_rank:
+                best, best_rank = waiter, rank
+        return best
+
+    def _queued(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def acquire(self, lane=DEFAULT_PRIORITY, timeout=None, max_queued=None):
+        with self._cond:
+            if self._active < self.capacity and not self._queued():
+                self._active += 1
+                return True
+            if max_queued is not None and self._queued() >= max_queued:
+                raise QueueFull(f"{self._queued()} requests already queued")
+
+            waiter = _Waiter(lane)
+            self._queues[lane].append(waiter)
+            deadline = None if timeout is None else waiter.enqueued_at + timeout
+            while not (self._active < self.capacity and self._next_waiter(time.monotonic()) is waiter):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self._queues[lane].remove(waiter)
+                    self._cond.notify_all()
+                    return False
+                self._cond.wait(remaining)
+
+            self._queues[lane].popleft()
+            self._active += 1
+            self._cond.notify_all()
+            return True
+
+    def release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, lane=DEFAULT_PRIORITY):
+        self.acquire(lane)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "active": self._active,
+                "capacity": self.capacity,
+                "queued": {lane: len(queue) for lane, queue in self._queues.items()},
+            }
@@ -0,0 +1,200 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB_PATH = os.path.join(ROOT_DIR, os.getenv("RESULTS_DB_PATH", "results.db"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    scan_id TEXT NOT NULL,
+    content_hash TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    filepaths TEXT,
+    classification TEXT,
+    vlm_output TEXT,
+    pipeline_output TEXT,
+    gpt_output TEXT,
+    questionnaire_data TEXT,
+    timings TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_results_scan_id ON results (scan_id, id);
+CREATE INDEX IF NOT EXISTS idx_results_content_hash ON results (content_hash, id);
+CREATE INDEX IF NOT EXISTS idx_results_created_at ON results (created_at, id);
+"""
+
+JSON_COLUMNS = ("filepaths", "classification", "questionnaire_data", "timings")
+SUMMARY_COLUMNS = ("id", "scan_id", "content_hash", "created_at", "updated_at", "filepaths", "timings")
+MAX_PAGE_SIZE = 200
+
+
+def _dumps(value):
+    return None if value is None else json.dumps(value)
+
+
+def _row_to_dict(row):
+    record = dict(row)
+    for column in JSON_COLUMNS:
+        if column in record and record[column] is not None:
+            record[column] = json.loads(record[column])
+    return record
+
+
+class ResultsStore:
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def save_result(
+        self,
+        scan_id,
+        content_hash=None,
+        filepaths=None,
+        classification=None,
+        vlm_output=None,
+        pipeline_output=None,
+        gpt_output=None,
+        questionnaire_data=None,
+        timings=None,
+    ):
+        now = datetime.now().isoformat()
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                """
+                INSERT INTO results (
+                    scan_id, content_hash, created_at, updated_at, filepaths, classification,
+                    vlm_output, pipeline_output, gpt_output, questionnaire_data, timings
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    scan_id,
+                    content_hash,
+                    now,
+                    now,
+                    _dumps(filepaths),
+                    _dumps(classification),
+                    vlm_output,
+                    pipeline_output,
+                    gpt_output,
+                    _dumps(questionnaire_data),
+                    _dumps(timings),
+                ),
+            )
+        return cursor.lastrowid
+
+    def update_gpt_output(self, scan_id, gpt_output, questionnaire_data=None, gpt_seconds=None):
+        record = self.get_by_scan_id(scan_id)
+        if record is None:
+            return None
+        timings = record.get("timings") or {}
+        if gpt_seconds is not None:
+            timings["gpt_seconds"] = gpt_seconds
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                """
+                UPDATE results
+                SET gpt_output = ?, questionnaire_data = COALESCE(?, questionnaire_data),
+                    timings = ?, updated_at = ?
+                WHERE id = ?
+                """,
+                (gpt_output, _dumps(questionnaire_data), _dumps(timings), datetime.now().isoformat(), record["id"]),
+            )
+        return record["id"]
+
+    def set_gpt_output(self, result_id, gpt_output):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "UPDATE results SET gpt_output = ?, updated_at = ? WHERE id = ?",
+                (gpt_output, datetime.now().isoformat(), result_id),
+            )
+
+    def list_pending_gpt(self, limit=100):
+        rows = self._connect().execute(
+            """
+            SELECT id, scan_id, pipeline_output, questionnaire_data FROM results
+            WHERE gpt_output IS NULL AND pipeline_output IS NOT NULL
+            ORDER BY id LIMIT ?
+            """,
+            (int(limit),),
+        ).fetchall()
+        return [_row_to_dict(row) for row in rows]
+
+    def count_classified(self):
+        return self._connect().execute("SELECT COUNT(*) FROM results WHERE classification IS NOT NULL").fetchone()[0]
+
+    def iter_classifications(self, batch_size=1000):
+        last_id = 0
+        while True:
+            rows = self._connect().execute(
+                """
+                SELECT id, scan_id, classification FROM results
+                WHERE classification IS NOT NULL AND id > ?
+                ORDER BY id LIMIT ?
+                """,
+                (last_id, batch_size),
+            ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield row["scan_id"], json.loads(row["classification"])
+            last_id = rows[-1]["id"]
+
+    def get_by_scan_id(self, scan_id):
+        row = self._connect().execute(
+            "SELECT * FROM results WHERE scan_id = ? ORDER BY id DESC LIMIT 1", (scan_id,)
+        ).fetchone()
+        return _row_to_dict(row) if row else None
+
+    def get_by_id(self, result_id):
+        row = self._connect().execute("SELECT * FROM results WHERE id = ?", (result_id,)).fetchone()
+        return _row_to_dict(row) if row else None
+
+    def list_results(self, limit=50, cursor=None, content_hash=None, since=None, until=None):
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        clauses = []
+        params = []
+        if cursor is not None:
+            clauses.append("id < ?")
+            params.append(int(cursor))
+        if content_hash:
+            clauses.append("content_hash = ?")
+            params.append(content_hash)
+        if since:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until:
+            clauses.append("created_at < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connect().execute(
+            f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM results {where} ORDER BY id DESC LIMIT ?",
+            (*params, limit + 1),
+        ).fetchall()
+        items = [_row_to_dict(row) for row in rows[:limit]]
+        next_cursor = items[-1]["id"] if len(rows) > limit else None
+        return {"items": items, "next_cursor": next_cursor, "limit": limit}
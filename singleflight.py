@@ -0,0 +1,110 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def hash_files(filepaths):
+    digest = hashlib.sha256()
+    for filepath in filepaths:
+        with open(filepath, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def make_key(stage, *parts):
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return f"{stage}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, max_tracked_keys=256):
+        self.max_tracked_keys = max_tracked_keys
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._key_stats = OrderedDict()
+        self._totals = {"executions": 0, "coalesced": 0, "errors": 0}
+
+    def _stats_for(self, key):
+        stats = self._key_stats.get(key)
+        if stats is None:
+            stats = {
+                "executions": 0,
+                "coalesced": 0,
+                "errors": 0,
+                "in_flight": False,
+                "waiters": 0,
+                "last_duration_seconds": None,
+            }
+            self._key_stats[key] = stats
+            while len(self._key_stats) > self.max_tracked_keys:
+                oldest_key = next(iter(self._key_stats))
+                if oldest_key in self._calls:
+                    self._key_stats.move_to_end(oldest_key)
+                    break
+                self._key_stats.popitem(last=False)
+        else:
+            self._key_stats.move_to_end(key)
+        return stats
+
+    def do(self, key, fn):
+        with self._lock:
+            stats = self._stats_for(key)
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+                stats["executions"] += 1
+                stats["in_flight"] = True
+                self._totals["executions"] += 1
+            else:
+                leader = False
+                stats["coalesced"] += 1
+                stats["waiters"] += 1
+                self._totals["coalesced"] += 1
+
+        if not leader:
+            call.done.wait()
+            with self._lock:
+                stats["waiters"] -= 1
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        start = time.perf_counter()
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            with self._lock:
+                stats["errors"] += 1
+                self._totals["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                stats["in_flight"] = False
+                stats["last_duration_seconds"] = round(time.perf_counter() - start, 3)
+            call.done.set()
+        return call.result, False
+
+    def metrics(self):
+        with self._lock:
+            total_requests = self._totals["executions"] + self._totals["coalesced"]
+            return {
+                "totals": dict(self._totals),
+                "in_flight": len(self._calls),
+                "coalesced_ratio": round(self._totals["coalesced"] / total_requests, 3) if total_requests else 0.0,
+                "keys": {key: dict(stats) for key, stats in self._key_stats.items()},
+            }
@@ -0,0 +1,101 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+ENTRY_POINTS = {
+    "pipeline_cli": [sys.executable, "pipeline.py", "--help"],
+    "gptapi_import": [sys.executable, "-c", "import gptapi"],
+    "gpt_bulk_cli": [sys.executable, "gpt_bulk.py", "--help"],
+    "api_boot": [sys.executable, "-c", "import medical_api"],
+    "image_to_dicom_cli": [sys.executable, "image_to_dicom.py", "--help"],
+    "dicom_to_image_cli": [sys.executable, "dicom_to_image.py", "--help"],
+}
+
+
+def parse_importtime(stderr):
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, module = line.split("|", 2)
+            self_us = int(self_us.split(":")[-1].strip())
+            cumulative_us = int(cumulative_us.strip())
+        except ValueError:
+            continue
+        imports.append((module.rstrip()[1:], self_us, cumulative_us))
+    return imports
+
+
+def profile_imports(command, top, env):
+    result = subprocess.run(
+        [command[0], "-X", "importtime", *command[1:]],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+        env={**env, "PYTHONIOENCODING": "utf-8"},
+    )
+    imports = parse_importtime(result.stderr)
+    top_level = [entry for entry in imports if not entry[0].startswith(" ")]
+    top_level.sort(key=lambda entry: entry[2], reverse=True)
+    return result.returncode, top_level[:top]
+
+
+def time_startup(command, runs, env):
+    durations = []
+    returncode = 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run(command, cwd=ROOT_DIR, capture_output=True, env=env)
+        durations.append(time.perf_counter() - start)
+        returncode = result.returncode
+    return returncode, durations
+
+
+def benchmark_entry_point(name, runs, top, env):
+    command = ENTRY_POINTS[name]
+    print(f"\n=== {name}: {' '.join(command[1:])} ===")
+
+    returncode, durations = time_startup(command, runs, env)
+    if returncode != 0:
+        print(f"  Warning: exited with code {returncode} (missing dependency or configuration?)")
+    durations_ms = [d * 1000 for d in durations]
+    print(
+        f"  startup over {runs} runs: "
+        f"min={min(durations_ms):.1f}ms median={statistics.median(durations_ms):.1f}ms max={max(durations_ms):.1f}ms"
+    )
+
+    _, slowest = profile_imports(command, top, env)
+    print("  slowest top-level imports (cumulative):")
+    for module, self_us, cumulative_us in slowest:
+        print(f"    {cumulative_us / 1000:8.1f}ms  (self {self_us / 1000:6.1f}ms)  {module}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark cold start time and profile imports for each entry point."
+    )
+    parser.add_argument("entry_points", nargs="*", help=f"Entry points to benchmark (default: all of {', '.join(ENTRY_POINTS)})")
+    parser.add_argument("--runs", type=int, default=5, help="Number of cold starts per entry point")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest top-level imports to report")
+    args = parser.parse_args()
+
+    names = args.entry_points or list(ENTRY_POINTS)
+    unknown = [name for name in names if name not in ENTRY_POINTS]
+    if unknown:
+        parser.error(f"unknown entry point(s): {', '.join(unknown)}")
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        # importing medical_api opens the results store, so point it at a throwaway database
+        env = {**os.environ, "RESULTS_DB_PATH": os.path.join(scratch_dir, "results.db")}
+        for name in names:
+            benchmark_entry_point(name, args.runs, args.top, env)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import os
+import threading
+import time
+from collections import deque
+from dotenv import load_dotenv
+
+from priority import percentiles
+
+load_dotenv()
+
+STUDY_POOL_SIZE = int(os.getenv("STUDY_POOL_SIZE", "0"))
+STUDY_POOL_MAX_AGE = float(os.getenv("STUDY_POOL_MAX_AGE", "900"))
+STUDY_POOL_RETRY_SECONDS = float(os.getenv("STUDY_POOL_RETRY_SECONDS", "5"))
+
+
+class StudyPool:
+    def __init__(
+        self,
+        create_study,
+        discard_study=None,
+        size=STUDY_POOL_SIZE,
+        max_age=STUDY_POOL_MAX_AGE,
+        retry_seconds=STUDY_POOL_RETRY_SECONDS,
+        history_size=200,
+    ):
+        self.create_study = create_study
+        self.discard_study = discard_study
+        self.size = max(0, size)
+        self.max_age = max_age
+        self.retry_seconds = retry_seconds
+        self._lock = threading.Lock()
+        self._studies = deque()
+        self._refill = threading.Event()
+        self._closed = threading.Event()
+        self._refill_latencies = deque(maxlen=history_size)
+        self._counters = {"hits": 0, "misses": 0, "expired": 0, "rejected": 0, "refill_errors": 0}
+        self._thread = threading.Thread(target=self._run, name="study-pool", daemon=True)
+        self._thread.start()
+        self._refill.set()
+
+    def _pop_expired(self, now, max_age):
+        expired = []
+        while self._studies and now - self._studies[0][1] > max_age:
+            expired.append(self._studies.popleft()[0])
+            self._counters["expired"] += 1
+        return expired
+
+    def _discard(self, studies):
+        if self.discard_study is None:
+            return
+        for study in studies:
+            try:
+                self.discard_study(study)
+            except Exception as e:
+                print(f"Failed to discard pooled study {study.id}: {e}")
+
+    def take(self):
+        with self._lock:
+            expired = self._pop_expired(time.monotonic(), self.max_age)
+            if self._studies:
+                study, _ = self._studies.popleft()
+                self._counters["hits"] += 1
+            else:
+                study = None
+                self._counters["misses"] += 1
+        self._refill.set()
+        self._discard(expired)
+        return study
+
+    def mark_rejected(self, study):
+        with self._lock:
+            self._counters["rejected"] += 1
+        print(f"Pooled study {study.id} was rejected, discarding it")
+        self._discard([study])
+
+    def _needs_refill(self):
+        with self._lock:
+            expired = self._pop_expired(time.monotonic(), self.max_age * 0.75)
+            needs_refill = len(self._studies) < self.size
+        self._discard(expired)
+        return needs_refill
+
+    def _run(self):
+        while not self._closed.is_set():
+            self._refill.wait(timeout=max(0.1, self.max_age / 4))
+            self._refill.clear()
+            while not self._closed.is_set() and self._needs_refill():
+                start = time.perf_counter()
+                try:
+                    study = self.create_study()
+                except Exception as e:
+                    with self._lock:
+                        self._counters["refill_errors"] += 1
+                    print(f"Study pool refill failed: {e}")
+                    self._closed.wait(self.retry_seconds)
+                    continue
+                with self._lock:
+                    self._refill_latencies.append(time.perf_counter() - start)
+                    self._studies.append((study, time.monotonic()))
+
+    def close(self):
+        self._closed.set()
+        self._refill.set()
+
+    def stats(self):
+        with self._lock:
+            requests = self._counters["hits"] + self._counters["misses"]
+            return {
+                "enabled": True,
+                "size": self.size,
+                "available": len(self._studies),
+                "max_age_seconds": self.max_age,
+                "hit_rate": round(self._counters["hits"] / requests, 3) if requests else None,
+                **self._counters,
+                "refill_latency_seconds": percentiles(self._refill_latencies),
+            }